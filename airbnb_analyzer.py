@@ -10,30 +10,73 @@ Usage 2: As a library (used by api_server.py)
 """
 
 import argparse
+import csv
+import gzip
+import hashlib
+import json
 import os
-import io
 import re
-from dataclasses import dataclass
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, Tuple, Optional, List
+from typing import IO, Callable, Dict, Tuple, Optional, List
 
 import warnings
 
 import numpy as np
 import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point
-from sklearn.cluster import DBSCAN
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from sklearn.cluster import HDBSCAN, dbscan
+from sklearn.neighbors import BallTree, NearestNeighbors
 import folium
 from folium.plugins import HeatMap, BeautifyIcon
 import requests
-from bs4 import BeautifulSoup
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
 BASE_URL = "http://data.insideairbnb.com"
 GET_DATA_URL = "https://insideairbnb.com/get-the-data/"
+EARTH_RADIUS_M = 6371000.0
+# Snapshot downloads and DBSCAN labels; AIRBNB_ANALYZER_CACHE_DIR overrides,
+# otherwise $XDG_CACHE_HOME (or ~/.cache)/airbnb_analyzer
+CACHE_DIR = os.environ.get("AIRBNB_ANALYZER_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "airbnb_analyzer",
+)
+# How long a resolved snapshot URL is trusted before re-scraping the index
+LISTINGS_INDEX_TTL = 6 * 3600
+# Anchor targets on the index page that point at a listings archive, and the
+# snapshot date embedded in their path
+LISTINGS_HREF_RE = re.compile(r"""href=["']([^"']+listings\.csv\.gz)["']""")
+SNAPSHOT_DATE_RE = re.compile(r"/(\d{4}-\d{2}-\d{2})/")
+# Internal working columns added by prepare_geodata, not exported
+RADIAN_COLUMNS = ("lat_rad", "lon_rad")
+# Currency symbol, thousands separators and whitespace in "$1,234.00" prices
+PRICE_STRIP_RE = re.compile(r"[$,\s]")
+# Columns a price band needs for clustering and cluster stats
+BAND_COLUMNS = ["latitude", "longitude", "price", "lat_rad", "lon_rad"]
+# Density clustering backends selectable per run (first is the default)
+CLUSTERERS = ("dbscan", "hdbscan")
+# Neighborhood score inputs and their weights in the investment score
+SCORE_COLUMNS = ["price", "distance_km", "number_of_reviews"]
+SCORE_WEIGHTS = np.array([0.4, 0.3, 0.3])
+
+# Only these listings.csv.gz columns are used downstream; everything else
+# (descriptions, host info, URLs...) is skipped at parse time.
+LISTING_TYPES: Dict[str, pa.DataType] = {
+    "id": pa.int64(),
+    "latitude": pa.float32(),
+    "longitude": pa.float32(),
+    "price": pa.string(),
+    "number_of_reviews": pa.float32(),
+    "neighbourhood": pa.dictionary(pa.int32(), pa.string()),
+    "neighbourhood_cleansed": pa.dictionary(pa.int32(), pa.string()),
+}
 
 
 # ---------------------------------------------------------------------------
@@ -41,7 +84,7 @@ GET_DATA_URL = "https://insideairbnb.com/get-the-data/"
 # ---------------------------------------------------------------------------
 
 
-@dataclass
+@dataclass(frozen=True)
 class CityConfig:
     code: str
     name: str
@@ -49,6 +92,12 @@ class CityConfig:
     center_lat: float
     center_lon: float
     landmarks: Dict[str, Tuple[float, float]]
+    # (n_landmarks, 2) array of (lat, lon) radians, derived once from landmarks
+    landmark_rad: np.ndarray = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        coords = np.array(list(self.landmarks.values()), dtype=np.float64)
+        object.__setattr__(self, "landmark_rad", np.radians(coords.reshape(-1, 2)))
 
 
 CITY_CONFIG: Dict[str, CityConfig] = {
@@ -251,16 +300,13 @@ def _resolve_latest_listings_url(
             f"HTTP {resp.status_code} while loading {GET_DATA_URL}"
         )
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-
     candidates: List[Tuple[datetime, str]] = []
-    pattern = re.compile(r"/(\d{4}-\d{2}-\d{2})/")
 
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
+    # One regex sweep over the page instead of building a DOM for every <a>
+    for href in LISTINGS_HREF_RE.findall(resp.text):
         # We only care about full listings CSVs for this city's data path
-        if city.path in href and href.endswith("listings.csv.gz"):
-            m = pattern.search(href)
+        if city.path in href:
+            m = SNAPSHOT_DATE_RE.search(href)
             if not m:
                 continue
             date_str = m.group(1)
@@ -285,6 +331,170 @@ def _resolve_latest_listings_url(
     return best_href, snapshot_date
 
 
+def _read_listings_csv(path: str) -> pd.DataFrame:
+    """
+    Parse a gzipped listings CSV with the multithreaded Arrow reader,
+    keeping only LISTING_TYPES columns.
+    """
+    # Arrow needs an explicit column list, so intersect the wanted columns
+    # with the header (optional ones vary between cities).
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f), [])
+    usecols = [c for c in LISTING_TYPES if c in header]
+
+    table = pacsv.read_csv(
+        pa.CompressedInputStream(pa.OSFile(path), "gzip"),
+        # Descriptions contain quoted newlines
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=usecols,
+            column_types={c: LISTING_TYPES[c] for c in usecols},
+        ),
+    )
+    return table.to_pandas()
+
+
+def _write_atomic(path: str, write: Callable[[IO], None], mode: str = "wb"):
+    """
+    Call write(f) on a uniquely named temp file beside path, then rename
+    it over path. Concurrent runs each get their own temp file, and a
+    killed run never leaves a partial file under the final name.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        encoding = None if "b" in mode else "utf-8"
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _load_listings_meta(meta_path: str) -> Dict:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _download_listings_uncached(
+    city: CityConfig, log: List[str]
+) -> Tuple[str, str, bool]:
+    """
+    Resolve and download the latest listings.csv.gz into a temp file, for
+    when CACHE_DIR is not writable. The caller removes the file once read.
+    """
+    try:
+        listings_url, used_date = _resolve_latest_listings_url(city, log)
+    except Exception as exc:  # noqa: BLE001
+        raise RuntimeError(f"Failed to detect snapshot date: {exc}") from exc
+
+    try:
+        resp = requests.get(listings_url, stream=True, timeout=120)
+    except Exception as exc:  # noqa: BLE001
+        raise RuntimeError(f"Failed to download {listings_url}: {exc}") from exc
+
+    with resp:
+        if resp.status_code != 200:
+            raise RuntimeError(
+                f"HTTP {resp.status_code} while downloading {listings_url}"
+            )
+        fd, gz_path = tempfile.mkstemp(suffix=".csv.gz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(resp.raw, f, 1 << 20)
+        except BaseException:
+            os.unlink(gz_path)
+            raise
+
+    return gz_path, used_date, True
+
+
+def _download_listings(
+    city: CityConfig, log: List[str]
+) -> Tuple[str, str, bool]:
+    """
+    Resolve and download the latest listings.csv.gz into CACHE_DIR.
+
+    The resolved snapshot is remembered for LISTINGS_INDEX_TTL seconds so the
+    index page is not re-scraped on every run, and a cached archive for the
+    same URL is revalidated with ETag / Last-Modified instead of re-downloaded.
+    If CACHE_DIR cannot be written, the archive goes to a temp file instead.
+
+    Returns:
+        (local_gz_path, snapshot_date_iso, is_temporary)
+    """
+    cache_dir = os.path.join(CACHE_DIR, "listings")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        writable = os.access(cache_dir, os.W_OK)
+    except OSError:
+        writable = False
+    if not writable:
+        log.append(f"Cache directory {cache_dir} is not writable; not caching.")
+        return _download_listings_uncached(city, log)
+
+    gz_path = os.path.join(cache_dir, f"{city.code}.csv.gz")
+    meta_path = os.path.join(cache_dir, f"{city.code}.meta.json")
+
+    meta = _load_listings_meta(meta_path) if os.path.exists(gz_path) else {}
+    age = time.time() - meta.get("resolved_at", 0)
+    if meta and age < LISTINGS_INDEX_TTL:
+        log.append(
+            f"Using cached snapshot {meta['snapshot_date']} "
+            f"(resolved {age / 3600:.1f} h ago): {gz_path}"
+        )
+        return gz_path, meta["snapshot_date"], False
+
+    # Resolve latest snapshot URL
+    try:
+        listings_url, used_date = _resolve_latest_listings_url(city, log)
+    except Exception as exc:  # noqa: BLE001
+        raise RuntimeError(f"Failed to detect snapshot date: {exc}") from exc
+
+    headers: Dict[str, str] = {}
+    if meta.get("url") == listings_url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    # Download (or revalidate) the CSV. The body is streamed straight to disk
+    # in its served (gzip) form rather than buffered in memory.
+    try:
+        resp = requests.get(listings_url, headers=headers, stream=True, timeout=120)
+    except Exception as exc:  # noqa: BLE001
+        raise RuntimeError(f"Failed to download {listings_url}: {exc}") from exc
+
+    with resp:
+        if resp.status_code == 304:
+            log.append(f"Cached listings are up to date: {gz_path}")
+        elif resp.status_code == 200:
+            _write_atomic(
+                gz_path, lambda f: shutil.copyfileobj(resp.raw, f, 1 << 20)
+            )
+        else:
+            raise RuntimeError(
+                f"HTTP {resp.status_code} while downloading {listings_url}"
+            )
+
+    meta = {
+        "url": listings_url,
+        "snapshot_date": used_date,
+        "etag": resp.headers.get("ETag", meta.get("etag")),
+        "last_modified": resp.headers.get("Last-Modified", meta.get("last_modified")),
+        "resolved_at": time.time(),
+    }
+    try:
+        _write_atomic(meta_path, lambda f: json.dump(meta, f), mode="w")
+    except OSError:
+        pass  # the archive is in place; the next run just re-resolves
+
+    return gz_path, used_date, False
+
+
 def fetch_city_listings(
     city_code: str,
     max_listings: Optional[int] = None,
@@ -293,6 +503,7 @@ def fetch_city_listings(
     """
     Fetch the latest listings.csv.gz for the given city by scraping the
     InsideAirbnb 'Get the Data' page and resolving the most recent snapshot.
+    Downloads are cached on disk (see _download_listings).
     """
     if log is None:
         log = []
@@ -304,28 +515,13 @@ def fetch_city_listings(
         ascii_header(f"FETCHING LISTINGS FOR {city.name.upper()} ({city.code})")
     )
 
-    # Resolve latest snapshot URL
-    try:
-        listings_url, used_date = _resolve_latest_listings_url(city, log)
-    except Exception as exc:  # noqa: BLE001
-        raise RuntimeError(f"Failed to detect snapshot date: {exc}") from exc
+    gz_path, used_date, temporary = _download_listings(city, log)
 
-    # Download and load CSV
     try:
-        resp = requests.get(listings_url, timeout=120)
-    except Exception as exc:  # noqa: BLE001
-        raise RuntimeError(f"Failed to download {listings_url}: {exc}") from exc
-
-    if resp.status_code != 200:
-        raise RuntimeError(
-            f"HTTP {resp.status_code} while downloading {listings_url}"
-        )
-
-    df = pd.read_csv(
-        io.BytesIO(resp.content),
-        compression="gzip",
-        low_memory=False,
-    )
+        df = _read_listings_csv(gz_path)
+    finally:
+        if temporary:
+            os.remove(gz_path)
     log.append(f"OK - loaded {len(df):,} listings from snapshot {used_date}")
 
     if max_listings is not None and len(df) > max_listings:
@@ -345,30 +541,33 @@ def prepare_geodata(df: pd.DataFrame, log: List[str]):
 
     # Clean price to numeric
     log.append("Converting price column to numeric dollars.")
-    price = df["price"].astype(str)
-    price = (
-        price.str.replace("$", "", regex=False)
-        .str.replace(",", "", regex=False)
-        .str.strip()
-    )
-    df["price"] = pd.to_numeric(price, errors="coerce")
+    price = df["price"].astype("string").str.replace(PRICE_STRIP_RE, "", regex=True)
+    df["price"] = pd.to_numeric(price, errors="coerce").astype(np.float32)
 
-    # Latitude and longitude
-    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
-    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    # Latitude and longitude. Price and coordinates are held as float32 so
+    # every downstream numpy pass (masking, distances, heatmap, cluster
+    # stats) reads half the bytes and never upcasts.
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce").astype(np.float32)
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce").astype(np.float32)
 
-    # Reviews (if present)
+    # Reviews (if present), as int32 counts
     if "number_of_reviews" in df.columns:
         df["number_of_reviews"] = (
-            pd.to_numeric(df["number_of_reviews"], errors="coerce").fillna(0)
+            pd.to_numeric(df["number_of_reviews"], errors="coerce")
+            .fillna(0)
+            .astype(np.int32)
         )
     else:
-        df["number_of_reviews"] = 0
+        df["number_of_reviews"] = np.zeros(len(df), dtype=np.int32)
 
     original = len(df)
-    # Increase cap to 5000 to support luxury + ultra tiers
-    df = df.dropna(subset=required_cols)
-    df = df[(df["price"] > 0) & (df["price"] <= 5000)]
+    # Single fused mask: NaN coordinates, NaN/zero prices and the price cap
+    # (5000 to support luxury + ultra tiers). NaN prices fail both comparisons.
+    lat = df["latitude"].to_numpy()
+    lon = df["longitude"].to_numpy()
+    price = df["price"].to_numpy()
+    mask = ~(np.isnan(lat) | np.isnan(lon)) & (price > 0) & (price <= 5000)
+    df = df.loc[mask]
 
     log.append(f"Cleaned listings: {original:,} -> {len(df):,}")
     if len(df) == 0:
@@ -381,13 +580,18 @@ def prepare_geodata(df: pd.DataFrame, log: List[str]):
     )
     log.append(f"Median price: {df['price'].median():.0f} dollars per night")
 
-    geometry = [Point(lon, lat) for lon, lat in zip(df["longitude"], df["latitude"])]
-    gdf = gpd.GeoDataFrame(df.copy(), geometry=geometry, crs="EPSG:4326")
-    return gdf, log
+    # Converted once here and shared by the landmark and DBSCAN steps.
+    # assign() returns a new frame, so the masked slice above is never
+    # written to (no SettingWithCopyWarning on pandas < 3).
+    df = df.assign(
+        lat_rad=np.radians(df["latitude"].to_numpy(np.float64)),
+        lon_rad=np.radians(df["longitude"].to_numpy(np.float64)),
+    )
+    return df, log
 
 
 def add_landmark_distances(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
     city: CityConfig,
     log: List[str],
 ):
@@ -397,36 +601,35 @@ def add_landmark_distances(
         log.append(
             "No landmark configuration for this city. Skipping distance analysis."
         )
-        gdf["distance_km"] = np.nan
-        return gdf, log
+        df["distance_km"] = np.nan
+        return df, log
 
-    landmark_points = [Point(lon, lat) for lat, lon in city.landmarks.values()]
-    landmark_gdf = gpd.GeoDataFrame(
-        {"name": list(city.landmarks.keys())},
-        geometry=landmark_points,
-        crs="EPSG:4326",
-    ).to_crs("EPSG:3857")
+    log.append("Computing distance in meters to nearest landmark.")
+    # Ball tree over the landmarks, queried once for every listing;
+    # haversine distances come back in radians.
+    tree = BallTree(city.landmark_rad, metric="haversine")
+    dist, _ = tree.query(df[["lat_rad", "lon_rad"]].to_numpy(), k=1)
+    df["distance_m"] = dist[:, 0] * EARTH_RADIUS_M
+    df["distance_km"] = (df["distance_m"] / 1000.0).round(2)
 
-    gdf_m = gdf.to_crs("EPSG:3857")
-
-    def nearest_distance(pt):
-        return landmark_gdf.distance(pt).min()
-
-    log.append(
-        "Computing distance in meters to nearest landmark (this can take a while)."
-    )
-    gdf["distance_m"] = gdf_m.geometry.apply(nearest_distance)
-    gdf["distance_km"] = (gdf["distance_m"] / 1000.0).round(2)
-
-    bins = [0, 2, 5, 10, 100]
     labels = ["<2km", "2-5km", "5-10km", ">10km"]
-    gdf["distance_cat"] = pd.cut(gdf["distance_km"], bins=bins, labels=labels)
-
-    dist_stats = gdf.groupby("distance_cat")["price"].agg(["mean", "median", "count"])
+    idx = np.digitize(df["distance_km"].to_numpy(), [2, 5, 10], right=True)
+    df["distance_cat"] = pd.Categorical.from_codes(idx, labels)
+
+    price = df["price"].to_numpy()
+    counts = np.bincount(idx, minlength=len(labels))
+    sums = np.bincount(idx, weights=price, minlength=len(labels))
+    with np.errstate(invalid="ignore"):
+        means = sums / counts
+    medians = pd.Series(price).groupby(idx).median().reindex(range(len(labels)))
+    dist_stats = pd.DataFrame(
+        {"mean": means, "median": medians.to_numpy(), "count": counts},
+        index=pd.Index(labels, name="distance_cat"),
+    )
     log.append("Price by distance bucket (mean / median / count):")
     log.append(str(dist_stats))
 
-    return gdf, log
+    return df, log
 
 
 # ---------------------------------------------------------------------------
@@ -434,18 +637,135 @@ def add_landmark_distances(
 # ---------------------------------------------------------------------------
 
 
+def _cached_dbscan(
+    coords: np.ndarray,
+    eps: float,
+    min_samples: int,
+    clusterer: str = "dbscan",
+) -> Tuple[np.ndarray, bool]:
+    """
+    Haversine DBSCAN on (lat, lon) radians with eps in meters.
+    With clusterer="hdbscan", HDBSCAN on a ball tree is used instead; it
+    needs no eps and takes min_samples as the minimum cluster size.
+    Labels are memoized on disk, keyed by the coordinates and parameters,
+    so re-running the same snapshot skips the neighbor search.
+
+    Returns:
+        (labels, loaded_from_cache)
+    """
+    key = hashlib.md5(np.ascontiguousarray(coords).tobytes()).hexdigest()
+    if clusterer == "hdbscan":
+        name = f"{key}_hdbscan_ms{min_samples}.npy"
+    else:
+        name = f"{key}_eps{eps:g}_ms{min_samples}.npy"
+    path = os.path.join(CACHE_DIR, "dbscan", name)
+    if os.path.exists(path):
+        try:
+            labels = np.load(path)
+        except (OSError, ValueError, EOFError):
+            labels = None  # unreadable entry: recompute and overwrite it
+        if labels is not None and labels.shape == (len(coords),):
+            return labels, True
+
+    if clusterer == "hdbscan":
+        labels = HDBSCAN(
+            min_cluster_size=min_samples, metric="haversine", algorithm="ball_tree"
+        ).fit_predict(coords)
+    else:
+        # Listings sharing a building share coordinates: cluster each distinct
+        # point once, weighted by how many listings sit on it, then broadcast
+        # the labels back. Core-point counts are identical to the full input.
+        points, inverse, weights = np.unique(
+            coords, axis=0, return_inverse=True, return_counts=True
+        )
+        # Sparse eps-neighborhood graph from a parallel ball-tree radius query;
+        # DBSCAN then only walks the stored neighbors.
+        eps_rad = eps / EARTH_RADIUS_M
+        graph = (
+            NearestNeighbors(
+                radius=eps_rad, algorithm="ball_tree", metric="haversine", n_jobs=-1
+            )
+            .fit(points)
+            .radius_neighbors_graph(points, mode="distance")
+        )
+        _, labels = dbscan(
+            graph,
+            eps=eps_rad,
+            min_samples=min_samples,
+            metric="precomputed",
+            sample_weight=weights,
+        )
+        labels = labels[inverse.ravel()]
+        # np.unique sorted the points, so sklearn's ids follow coordinate
+        # order. Renumber clusters by the first listing that belongs to each
+        # one so ids follow listing order. They need not match DBSCAN on the
+        # raw input, which numbers clusters by the first core point it expands
+        # from; the memberships are the same.
+        clustered = labels >= 0
+        _, first = np.unique(labels[clustered], return_index=True)
+        remap = np.empty(len(first), dtype=labels.dtype)
+        remap[np.argsort(first)] = np.arange(len(first))
+        labels[clustered] = remap[labels[clustered]]
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, lambda f: np.save(f, labels))
+    except OSError:
+        pass  # cache is best-effort
+    return labels, False
+
+
+def _aggregate_clusters(
+    labels: np.ndarray,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    price: np.ndarray,
+) -> pd.DataFrame:
+    """
+    Per-cluster centers and price stats in one pass over the band.
+    DBSCAN labels are 0..K-1 (noise is -1), so they index the K buckets directly.
+    """
+    keep = labels >= 0
+    k = labels[keep]
+    # Inputs are float32; widen and round to the source precision so exports
+    # show 40.75356 / 129.99 rather than float32 artifacts.
+    lat = lat[keep].astype(np.float64).round(6)
+    lon = lon[keep].astype(np.float64).round(6)
+    price = price[keep].astype(np.float64).round(2)
+    n = int(k.max()) + 1 if k.size else 0
+
+    counts = np.bincount(k, minlength=n)
+    price_sum = np.bincount(k, weights=price, minlength=n)
+    max_price = np.full(n, -np.inf)
+    np.maximum.at(max_price, k, price)
+
+    return pd.DataFrame(
+        {
+            "cluster_id": np.arange(n),
+            "center_lat": np.bincount(k, weights=lat, minlength=n) / counts,
+            "center_lon": np.bincount(k, weights=lon, minlength=n) / counts,
+            "listing_count": counts,
+            "avg_price": price_sum / counts,
+            "max_price": max_price,
+            "total_value": price_sum,
+        }
+    )
+
+
 def _detect_band_clusters(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
     min_price: float,
     max_price: float,
     label: str,
     log: List[str],
+    clusterer: str = "dbscan",
 ):
     """
     Generic helper to detect clusters in a specific price band.
     Tier-aware DBSCAN params + full safety on empty results.
     """
-    band = gdf[(gdf["price"] >= min_price) & (gdf["price"] < max_price)].copy()
+    price = df["price"].to_numpy()
+    band = df.loc[(price >= min_price) & (price < max_price), BAND_COLUMNS]
 
     # ---- Safe formatting for band description ----
     if max_price < 999999:
@@ -458,7 +778,7 @@ def _detect_band_clusters(
     )
     log.append(
         f"{label} listings: {len(band):,} "
-        f"({(len(band) / len(gdf) * 100):.1f} percent of total)"
+        f"({(len(band) / len(df) * 100):.1f} percent of total)"
     )
 
     # If no listings at all in this band → short-circuit
@@ -489,36 +809,30 @@ def _detect_band_clusters(
         eps = 300.0
         min_samples = 10
 
-    # Project to meters (Web Mercator) for DBSCAN
-    band_m = band.to_crs("EPSG:3857")
-    coords = np.column_stack([band_m.geometry.x, band_m.geometry.y])
+    # Haversine DBSCAN works on (lat, lon) radians; eps is meters on the sphere
+    coords = band[["lat_rad", "lon_rad"]].to_numpy()
 
-    clustering = DBSCAN(eps=eps, min_samples=min_samples)
-    labels = clustering.fit_predict(coords)
+    labels, cached = _cached_dbscan(coords, eps, min_samples, clusterer)
+    if cached:
+        log.append(
+            f"{label}: reusing cached {clusterer.upper()} labels for identical input."
+        )
     band["cluster"] = labels
 
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
-    log.append(f"{label}: DBSCAN finished. Clusters found (excluding noise): {n_clusters}")
-
-    clusters: List[Dict] = []
-    for cid in sorted(set(labels)):
-        if cid == -1:
-            continue
-        cluster_data = band[band["cluster"] == cid]
-        clusters.append(
-            {
-                "cluster_id": int(cid),
-                "center_lat": float(cluster_data["latitude"].mean()),
-                "center_lon": float(cluster_data["longitude"].mean()),
-                "listing_count": int(len(cluster_data)),
-                "avg_price": float(cluster_data["price"].mean()),
-                "max_price": float(cluster_data["price"].max()),
-                "total_value": float(cluster_data["price"].sum()),
-                "tier": label,
-            }
-        )
+    log.append(
+        f"{label}: {clusterer.upper()} finished. "
+        f"Clusters found (excluding noise): {n_clusters}"
+    )
+
+    cluster_df = _aggregate_clusters(
+        labels,
+        band["latitude"].to_numpy(),
+        band["longitude"].to_numpy(),
+        band["price"].to_numpy(),
+    )
+    cluster_df["tier"] = label
 
-    cluster_df = pd.DataFrame(clusters)
     if cluster_df.empty:
         log.append(f"No dense {label.lower()} clusters found.")
         return band, cluster_df, log
@@ -531,43 +845,48 @@ def _detect_band_clusters(
 
 
 def detect_premium_clusters(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
     premium_threshold: float,
     log: List[str],
+    clusterer: str = "dbscan",
 ):
     """
     Premium band: [premium_threshold, 1000)
     """
     log.append(ascii_header("STEP 3 - PREMIUM HOTSPOT DETECTION"))
     return _detect_band_clusters(
-        gdf=gdf,
+        df=df,
         min_price=premium_threshold,
         max_price=1000.0,
         label="Premium",
         log=log,
+        clusterer=clusterer,
     )
 
 
 def detect_luxury_clusters(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
     log: List[str],
+    clusterer: str = "dbscan",
 ):
     """
     Luxury band: [1000, 2500)
     """
     log.append(ascii_header("STEP 3B - LUXURY HOTSPOT DETECTION"))
     return _detect_band_clusters(
-        gdf=gdf,
+        df=df,
         min_price=1000.0,
         max_price=2500.0,
         label="Luxury",
         log=log,
+        clusterer=clusterer,
     )
 
 
 def detect_ultra_luxury_clusters(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
     log: List[str],
+    clusterer: str = "dbscan",
 ):
     """
     Ultra Luxury band: [2500, 5000]
@@ -575,11 +894,12 @@ def detect_ultra_luxury_clusters(
     """
     log.append(ascii_header("STEP 3C - ULTRA LUXURY HOTSPOT DETECTION"))
     return _detect_band_clusters(
-        gdf=gdf,
+        df=df,
         min_price=2500.0,
         max_price=5001.0,
         label="Ultra Luxury",
         log=log,
+        clusterer=clusterer,
     )
 
 
@@ -589,14 +909,14 @@ def detect_ultra_luxury_clusters(
 
 
 def score_neighborhoods(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
     log: List[str],
 ):
     log.append(ascii_header("STEP 4 - NEIGHBORHOOD INVESTMENT SCORES"))
 
     hood_col: Optional[str] = None
     for col in ["neighbourhood_cleansed", "neighbourhood"]:
-        if col in gdf.columns:
+        if col in df.columns:
             hood_col = col
             break
 
@@ -604,30 +924,38 @@ def score_neighborhoods(
         log.append("No neighborhood column in dataset. Skipping investment scores.")
         return pd.DataFrame(), log
 
-    stats = gdf.groupby(hood_col).agg(
-        price=("price", "mean"),
-        listing_count=("id", "count") if "id" in gdf.columns else ("price", "count"),
+    stats = df.groupby(hood_col, observed=True, sort=False).agg(
+        listing_count=("id", "count") if "id" in df.columns else ("price", "count"),
         distance_km=("distance_km", "mean"),
         number_of_reviews=("number_of_reviews", "mean"),
     )
+    # Averaged in float64: a float32 mean exports as e.g. 444.57056
+    price = df["price"].astype(np.float64).round(2)
+    stats.insert(
+        0,
+        "price",
+        price.groupby(df[hood_col], observed=True, sort=False).mean(),
+    )
 
-    def norm(series: pd.Series) -> pd.Series:
-        if series.max() == 0:
-            return series * 0
-        return (series / series.max()) * 100.0
-
-    stats["price_score"] = norm(stats["price"]).round(1)
-    if stats["distance_km"].notna().any():
-        stats["location_score"] = (100.0 - norm(stats["distance_km"])).round(1)
-    else:
-        stats["location_score"] = 0.0
-    stats["demand_score"] = norm(stats["number_of_reviews"]).round(1)
-
-    stats["investment_score"] = (
-        stats["price_score"] * 0.4
-        + stats["location_score"] * 0.3
-        + stats["demand_score"] * 0.3
-    ).round(1)
+    # One (n, 3) block for price / distance / reviews: all three peaks come
+    # from a single reduction and are scaled to 0-100 in one division. A zero
+    # or all-NaN peak scores 0.
+    metrics = stats[SCORE_COLUMNS].to_numpy(np.float64)
+    # fmax skips NaN and yields NaN for an all-NaN column without warning
+    # (nanmax would need process-wide warning filters, unsafe across threads)
+    peaks = np.fmax.reduce(metrics, axis=0)
+    scores = np.divide(
+        metrics, peaks, out=np.zeros_like(metrics), where=peaks > 0
+    ) * 100.0
+    # Closer to landmarks is better; without distances location scores 0
+    if not np.isnan(peaks[1]):
+        scores[:, 1] = 100.0 - scores[:, 1]
+    scores = scores.round(1)
+
+    stats["price_score"] = scores[:, 0]
+    stats["location_score"] = scores[:, 1]
+    stats["demand_score"] = scores[:, 2]
+    stats["investment_score"] = (scores * SCORE_WEIGHTS).sum(axis=1).round(1)
 
     top = stats.sort_values("investment_score", ascending=False).head(10)
     log.append("Top neighborhoods by investment score:")
@@ -641,8 +969,62 @@ def score_neighborhoods(
 # ---------------------------------------------------------------------------
 
 
+CLUSTER_MARKER_COLUMNS = [
+    "cluster_id",
+    "center_lat",
+    "center_lon",
+    "listing_count",
+    "avg_price",
+]
+CLUSTER_POPUP_TEMPLATE = (
+    "{tier} cluster {cid}<br>Listings: {n}<br>Average price: ${avg:.0f}"
+)
+
+
+def _add_cluster_layer(
+    fmap: folium.Map,
+    clusters: pd.DataFrame,
+    tier: str,
+    color: str,
+    radius: int,
+    fill_opacity: float,
+) -> None:
+    """
+    Add one tier's cluster centers as a single GeoJSON layer of circle
+    markers: one JSON payload and one shared style instead of a rendered
+    CircleMarker template per cluster.
+    """
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+            "properties": {
+                "popup": CLUSTER_POPUP_TEMPLATE.format(
+                    tier=tier, cid=int(cid), n=int(n), avg=avg
+                )
+            },
+        }
+        for cid, lat, lon, n, avg in clusters[CLUSTER_MARKER_COLUMNS].itertuples(
+            index=False, name=None
+        )
+    ]
+    style = {
+        "color": color,
+        "fill": True,
+        "fillColor": color,
+        "fillOpacity": fill_opacity,
+    }
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name=f"{tier} clusters",
+        marker=folium.CircleMarker(radius=radius),
+        style_function=lambda _feature: style,
+        popup=folium.GeoJsonPopup(fields=["popup"], labels=False),
+    ).add_to(fmap)
+
+
 def build_map(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
     premium_clusters: pd.DataFrame,
     luxury_clusters: pd.DataFrame,
     ultra_clusters: pd.DataFrame,
@@ -656,8 +1038,8 @@ def build_map(
 
     os.makedirs(maps_dir, exist_ok=True)
 
-    center_lat = gdf["latitude"].mean() if not gdf.empty else city.center_lat
-    center_lon = gdf["longitude"].mean() if not gdf.empty else city.center_lon
+    center_lat = df["latitude"].mean() if not df.empty else city.center_lat
+    center_lon = df["longitude"].mean() if not df.empty else city.center_lon
 
     fmap = folium.Map(
         location=[center_lat, center_lon],
@@ -666,69 +1048,38 @@ def build_map(
     )
 
     # Heatmap of prices
-    sample = gdf.sample(min(5000, len(gdf)), random_state=42)
-    heat_data = [
-        [row["latitude"], row["longitude"], row["price"]] for _, row in sample.iterrows()
-    ]
+    # Sample row positions and index the three arrays directly (no frame copy)
+    n_sample = min(5000, len(df))
+    idx = np.random.default_rng(42).choice(len(df), n_sample, replace=False)
+    # Widened and rounded before tolist(): float32 values would otherwise be
+    # written into the HTML as 17-digit float64 reprs.
+    heat_data = np.column_stack(
+        [
+            df["latitude"].to_numpy(np.float64)[idx].round(6),
+            df["longitude"].to_numpy(np.float64)[idx].round(6),
+            df["price"].to_numpy(np.float64)[idx].round(2),
+        ]
+    ).tolist()
     HeatMap(heat_data, radius=15, blur=25, max_zoom=13).add_to(fmap)
-    log.append(f"Added heatmap with {len(sample)} sample listings.")
+    log.append(f"Added heatmap with {n_sample} sample listings.")
 
     # Premium clusters (gold)
     if not premium_clusters.empty:
-        for _, cl in premium_clusters.iterrows():
-            folium.CircleMarker(
-                location=[cl["center_lat"], cl["center_lon"]],
-                radius=15,
-                popup=(
-                    f"Premium cluster {int(cl['cluster_id'])}<br>"
-                    f"Listings: {int(cl['listing_count'])}<br>"
-                    f"Average price: ${cl['avg_price']:.0f}"
-                ),
-                color="gold",
-                fill=True,
-                fill_color="gold",
-                fill_opacity=0.7,
-            ).add_to(fmap)
+        _add_cluster_layer(fmap, premium_clusters, "Premium", "gold", 15, 0.7)
         log.append(f"Added {len(premium_clusters)} premium cluster markers.")
     else:
         log.append("No premium clusters to show on the map.")
 
     # Luxury clusters (blue)
     if not luxury_clusters.empty:
-        for _, cl in luxury_clusters.iterrows():
-            folium.CircleMarker(
-                location=[cl["center_lat"], cl["center_lon"]],
-                radius=17,
-                popup=(
-                    f"Luxury cluster {int(cl['cluster_id'])}<br>"
-                    f"Listings: {int(cl['listing_count'])}<br>"
-                    f"Average price: ${cl['avg_price']:.0f}"
-                ),
-                color="blue",
-                fill=True,
-                fill_color="blue",
-                fill_opacity=0.6,
-            ).add_to(fmap)
+        _add_cluster_layer(fmap, luxury_clusters, "Luxury", "blue", 17, 0.6)
         log.append(f"Added {len(luxury_clusters)} luxury cluster markers.")
     else:
         log.append("No luxury clusters to show on the map.")
 
     # Ultra Luxury clusters (red)
     if not ultra_clusters.empty:
-        for _, cl in ultra_clusters.iterrows():
-            folium.CircleMarker(
-                location=[cl["center_lat"], cl["center_lon"]],
-                radius=19,
-                popup=(
-                    f"Ultra Luxury cluster {int(cl['cluster_id'])}<br>"
-                    f"Listings: {int(cl['listing_count'])}<br>"
-                    f"Average price: ${cl['avg_price']:.0f}"
-                ),
-                color="red",
-                fill=True,
-                fill_color="red",
-                fill_opacity=0.6,
-            ).add_to(fmap)
+        _add_cluster_layer(fmap, ultra_clusters, "Ultra Luxury", "red", 19, 0.6)
         log.append(f"Added {len(ultra_clusters)} ultra luxury cluster markers.")
     else:
         log.append("No ultra luxury clusters to show on the map.")
@@ -760,7 +1111,7 @@ def build_map(
 
 
 def export_outputs(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
     premium_clusters: pd.DataFrame,
     luxury_clusters: pd.DataFrame,
     ultra_clusters: pd.DataFrame,
@@ -777,9 +1128,14 @@ def export_outputs(
 
     prefix = f"{city.code}_{data_date}_min{int(premium_threshold)}"
 
-    # Main analyzed data
+    # Main analyzed data, via Arrow's multithreaded C++ CSV writer
     main_path = os.path.join(outputs_dir, f"{prefix}_analyzed_data.csv")
-    gdf.to_csv(main_path, index=False)
+    table = pa.Table.from_pandas(
+        df,
+        columns=[c for c in df.columns if c not in RADIAN_COLUMNS],
+        preserve_index=False,
+    )
+    pacsv.write_csv(table, main_path)
     log.append(f"Saved main analyzed data to {main_path}")
 
     # Premium clusters
@@ -847,6 +1203,7 @@ def run_analysis(
     maps_dir: str = "maps",
     outputs_dir: str = "output",
     verbose: bool = True,
+    clusterer: str = "dbscan",
 ) -> Dict:
     """
     Run the full pipeline and return a summary dictionary.
@@ -857,25 +1214,37 @@ def run_analysis(
 
     code = normalize_city_code(city_code)
     city = CITY_CONFIG[code]
+    if clusterer not in CLUSTERERS:
+        raise ValueError(
+            f"Unknown clusterer: {clusterer}. Valid options: {', '.join(CLUSTERERS)}"
+        )
 
     log.append(ascii_header("AIRBNB PRICE HOTSPOT ANALYZER"))
 
     # Pipeline
     df, data_date, log = fetch_city_listings(code, max_listings=max_listings, log=log)
-    gdf, log = prepare_geodata(df, log)
-    gdf, log = add_landmark_distances(gdf, city, log)
+    df, log = prepare_geodata(df, log)
+    df, log = add_landmark_distances(df, city, log)
+
+    # Premium / Luxury / Ultra-Luxury tiers. The price bands are disjoint and
+    # the neighbor search / DBSCAN release the GIL, so the three passes run
+    # concurrently; each writes its own log, merged back in tier order.
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        premium_job = pool.submit(
+            detect_premium_clusters, df, premium_threshold, [], clusterer
+        )
+        luxury_job = pool.submit(detect_luxury_clusters, df, [], clusterer)
+        ultra_job = pool.submit(detect_ultra_luxury_clusters, df, [], clusterer)
 
-    # Premium / Luxury / Ultra-Luxury tiers
-    premium_gdf, premium_clusters_df, log = detect_premium_clusters(
-        gdf, premium_threshold, log
-    )
-    luxury_gdf, luxury_clusters_df, log = detect_luxury_clusters(gdf, log)
-    ultra_gdf, ultra_clusters_df, log = detect_ultra_luxury_clusters(gdf, log)
+    premium_df, premium_clusters_df, premium_log = premium_job.result()
+    luxury_df, luxury_clusters_df, luxury_log = luxury_job.result()
+    ultra_df, ultra_clusters_df, ultra_log = ultra_job.result()
+    log.extend(premium_log + luxury_log + ultra_log)
 
-    hood_scores, log = score_neighborhoods(gdf, log)
+    hood_scores, log = score_neighborhoods(df, log)
 
     map_path = build_map(
-        gdf=gdf,
+        df=df,
         premium_clusters=premium_clusters_df,
         luxury_clusters=luxury_clusters_df,
         ultra_clusters=ultra_clusters_df,
@@ -887,7 +1256,7 @@ def run_analysis(
     )
 
     export_outputs(
-        gdf=gdf,
+        df=df,
         premium_clusters=premium_clusters_df,
         luxury_clusters=luxury_clusters_df,
         ultra_clusters=ultra_clusters_df,
@@ -913,9 +1282,9 @@ def run_analysis(
         "city_name": city.name,
         "data_date": data_date,
         "premium_threshold": float(premium_threshold),
-        "total_listings": int(len(gdf)),
-        "median_price": float(gdf["price"].median()),
-        "premium_listing_count": int(len(premium_gdf)),
+        "total_listings": int(len(df)),
+        "median_price": float(df["price"].median()),
+        "premium_listing_count": int(len(premium_df)),
         "premium_cluster_count": int(len(premium_clusters_df))
         if not premium_clusters_df.empty
         else 0,
@@ -974,6 +1343,15 @@ def main():
             "(sampled if more are available)."
         ),
     )
+    parser.add_argument(
+        "--clusterer",
+        choices=CLUSTERERS,
+        default=CLUSTERERS[0],
+        help=(
+            "Density clustering backend (default dbscan). hdbscan needs no "
+            "eps and finds clusters of varying density."
+        ),
+    )
 
     args = parser.parse_args()
 
@@ -982,6 +1360,7 @@ def main():
         premium_threshold=args.premium_threshold,
         max_listings=args.max_listings,
         verbose=True,
+        clusterer=args.clusterer,
     )
 
 
@@ -14,84 +14,425 @@ Everything has been fully fixed and cleaned for compatibility with:
 """
 
 import os
-import glob
-from typing import Dict, Optional
+import csv
+import hashlib
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from flask import (
     Flask,
-    jsonify,
+    Response,
     request,
     render_template,
     send_from_directory,
 )
+from flask_compress import Compress
 from flask_cors import CORS
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 
-from airbnb_analyzer import run_analysis, CITY_CONFIG
+from airbnb_analyzer import run_analysis, normalize_city_code, CITY_CONFIG
 
 # -----------------------------------------------------------------------------
 # Setup
 # -----------------------------------------------------------------------------
 
 app = Flask(__name__)
-CORS(app)
+# X-Output-Version is read by cross-origin dashboards too
+CORS(app, expose_headers=["X-Output-Version"])
+
+# Brotli where the client accepts it, gzip otherwise; tabular JSON shrinks
+# roughly tenfold. CSV exports are left alone: compressing them rewrites the
+# ETag after send_from_directory's conditional check (so 304s never happen)
+# and would encode the empty X-Sendfile body.
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_MIN_SIZE"] = 1024
+app.config["COMPRESS_MIMETYPES"] = ["application/json", "text/html"]
+Compress(app)
+
+# Seconds browsers/proxies may reuse hotspot and map-list responses
+API_CACHE_MAX_AGE = 60
+# Seconds a downloaded export is fresh before it is revalidated by ETag
+EXPORT_MAX_AGE = 30
+
+# Behind Apache (mod_xsendfile) or lighttpd, USE_X_SENDFILE=1 hands file
+# bodies to the front end server instead of streaming them through Python.
+# nginx uses X-Accel-Redirect instead and does not honour this header.
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
 
 BASE_DIR = os.getcwd()
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 MAPS_DIR = os.path.join(BASE_DIR, "maps")
 
+# Background /api/analyze jobs record their state here as {job_id}.json, so
+# any worker process can answer a status poll.
+JOBS_DIR = os.path.join(OUTPUT_DIR, "jobs")
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(MAPS_DIR, exist_ok=True)
+os.makedirs(JOBS_DIR, exist_ok=True)
+
+# Analyses run off the request thread when the client asks for a job;
+# threads start on first submit, so this is safe to create before forking.
+ANALYZE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="analyze")
+_JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+# Seconds a job state file is kept; older ones are pruned on the next submit
+JOB_RETENTION = 24 * 3600
+# Seconds after which a dead-claim takeover lock is considered abandoned
+CLAIM_LOCK_TIMEOUT = 5.0
+
+# Jobs this process is running. A queued/running job recorded under our pid
+# but missing here belongs to an earlier process that reused the pid.
+_LIVE_JOBS: set = set()
+
+# CSV -> JSON encoding for /api/hotspots runs here; handler threads that ask
+# for the same file version while it is being parsed wait on one future.
+_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="csv-io")
+_IO_PENDING: Dict[Tuple[str, int, Optional[int], bool], Future] = {}
+# Re-entrant: a future that is already done runs its callback inline
+_IO_LOCK = threading.RLock()
+
+# {city}_{date}_min{threshold}_analyzed_data.csv, parsed in one match
+_LATEST_RE = re.compile(
+    r"^(?P<city>[^_]+)_(?P<date>\d{4}-\d{2}-\d{2})_min(?P<thr>[\d.]+)"
+    r"_analyzed_data\.csv$"
+)
+
+# Seconds the output directory index is reused; a change to the directory
+# drops it early
+OUTPUT_INDEX_TTL = 2.0
+
+# (OUTPUT_DIR mtime_ns, expiry on the monotonic clock, index) from the last scan
+_OUTPUT_INDEX: Tuple[int, float, Dict[Tuple[str, str], List[Tuple[float, str]]]] = (
+    -1,
+    0.0,
+    {},
+)
+
+# Seconds the X-Output-Version value is reused before output/ is rescanned
+OUTPUT_VERSION_TTL = 1.0
+
+# (expiry on the monotonic clock, version) from the last output/ scan
+_OUTPUT_VERSION: Tuple[float, int] = (0.0, 0)
+
+# Endpoints cheap enough to poll that carry X-Output-Version
+OUTPUT_VERSION_ENDPOINTS = {"api_cities", "api_last_run"}
+
+# (MAPS_DIR mtime_ns, encoded /api/maps/list payload) from the last scan
+_MAPS_CACHE: Tuple[int, bytes] = (-1, b"")
+
+# Rows turned into dicts per orjson call when encoding CSV records
+JSON_BATCH_ROWS = 512
+
+# Total encoded bytes of /api/hotspots rows kept in memory per process; the
+# least recently used entries are dropped first. raw_listings for NYC alone
+# is ~21 MB, so this is a byte budget rather than an entry count.
+JSON_CACHE_MAX_BYTES = 64 << 20
+
+# (path, mtime_ns, limit, columnar) -> (row count, comma-joined JSON rows)
+_JSON_CACHE: "OrderedDict[Tuple[str, int, Optional[int], bool], Tuple[int, bytes]]" = (
+    OrderedDict()
+)
+_JSON_CACHE_BYTES = 0
+_JSON_CACHE_LOCK = threading.Lock()
+
+# CITY_CONFIG never changes after import, so /api/cities is serialized once
+_CITIES_PAYLOAD = orjson.dumps({
+    "success": True,
+    "cities": sorted(
+        ({"code": cfg.code, "name": cfg.name} for cfg in CITY_CONFIG.values()),
+        key=lambda x: x["name"],
+    ),
+})
+_CITIES_ETAG = hashlib.sha1(_CITIES_PAYLOAD).hexdigest()
 
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
 
+def json_response(obj, status: int = 200) -> Response:
+    """
+    JSON response serialized by orjson (C) instead of jsonify's stdlib json.
+    """
+    body = orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return Response(body, status=status, mimetype="application/json")
+
+
+def _clear_output_index():
+    global _OUTPUT_INDEX
+    _OUTPUT_INDEX = (-1, 0.0, {})
+
+
+def output_index() -> Dict[Tuple[str, str], List[Tuple[float, str]]]:
+    """
+    (city, keyword) -> [(mtime, path), ...] for every export named
+        {city}_{date}_min{threshold}_{keyword}.csv
+    Built by one os.scandir() pass and shared by every endpoint for
+    OUTPUT_INDEX_TTL seconds. A new or removed file bumps the directory
+    mtime, which drops the index at once, so fresh exports show up on
+    the next request.
+    """
+    global _OUTPUT_INDEX
+
+    dir_mtime = os.stat(OUTPUT_DIR).st_mtime_ns
+    now = time.monotonic()
+    if _OUTPUT_INDEX[0] == dir_mtime and now < _OUTPUT_INDEX[1]:
+        return _OUTPUT_INDEX[2]
+
+    index: Dict[Tuple[str, str], List[Tuple[float, str]]] = {}
+    with os.scandir(OUTPUT_DIR) as entries:
+        for entry in entries:
+            parts = entry.name.split("_", 3)
+            if (
+                len(parts) < 4
+                or not parts[2].startswith("min")
+                or not parts[3].endswith(".csv")
+            ):
+                continue
+            key = (parts[0], parts[3][: -len(".csv")])
+            index.setdefault(key, []).append((entry.stat().st_mtime, entry.path))
+
+    _OUTPUT_INDEX = (dir_mtime, now + OUTPUT_INDEX_TTL, index)
+    return index
+
+
+def output_version() -> int:
+    """
+    Newest mtime_ns among the files in OUTPUT_DIR and the directory
+    itself, so a rewrite, a new run and a deletion all change it.
+    Rescanned at most once per OUTPUT_VERSION_TTL seconds.
+    """
+    global _OUTPUT_VERSION
+
+    now = time.monotonic()
+    if now < _OUTPUT_VERSION[0]:
+        return _OUTPUT_VERSION[1]
+
+    version = os.stat(OUTPUT_DIR).st_mtime_ns
+    with os.scandir(OUTPUT_DIR) as entries:
+        for entry in entries:
+            if entry.is_file():
+                version = max(version, entry.stat().st_mtime_ns)
+
+    _OUTPUT_VERSION = (now + OUTPUT_VERSION_TTL, version)
+    return version
+
+
 def find_latest_run_for_city(city_code: str) -> Optional[Dict]:
     """
     Detect the newest analyzed_data CSV for a city.
     Example file pattern:
         nyc_2025-10-01_min200_analyzed_data.csv
     """
-    pattern = os.path.join(OUTPUT_DIR, f"{city_code}_*_min*_analyzed_data.csv")
-    files = glob.glob(pattern)
-    if not files:
+    # Only names with an ISO date parse; skip the rest before picking the
+    # newest, so one odd file does not hide older valid runs.
+    runs = []
+    for mtime, path in output_index().get((city_code, "analyzed_data"), []):
+        m = _LATEST_RE.match(os.path.basename(path))
+        if m:
+            runs.append((mtime, path, m))
+    if not runs:
         return None
 
-    # Sort newest by mod time
-    files.sort(key=lambda f: os.path.getmtime(f), reverse=True)
-    path = files[0]
-
-    name = os.path.basename(path)
-    stem = name.replace(".csv", "")
-    parts = stem.split("_")
-    if len(parts) < 3:
-        return None
+    # Newest by mod time
+    _, path, m = max(runs, key=lambda run: run[:2])
 
     return {
-        "city": parts[0],
-        "date": parts[1],
-        "threshold": float(parts[2].replace("min", "")),
+        "city": m["city"],
+        "date": m["date"],
+        "threshold": float(m["thr"]),
         "path": path,
     }
 
 
-def load_csv_records(path: str, limit: Optional[int] = None):
+def conditional(resp: Response, last_modified: Optional[float] = None) -> Response:
+    """
+    Tag a response with a body ETag unless it already has one (and with
+    Last-Modified when given), and turn it into a bodiless 304 when the
+    client's cached copy still matches.
+    """
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+
+def read_csv_header(path: str) -> List[str]:
+    """Column names from the first line of a CSV ([] if it is empty)."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def _universal_newlines(batch: pa.RecordBatch) -> pa.RecordBatch:
+    """
+    Turn \r\n and lone \r inside values into \n, as the text-mode open()
+    behind the old csv.DictReader did. Arrow keeps them verbatim, and
+    listing descriptions written on Windows carry \r\n.
     """
-    Lightweight CSV → list of dicts.
+    columns = []
+    for col in batch.columns:
+        if pc.any(pc.match_substring(col, "\r")).as_py():
+            col = pc.replace_substring_regex(col, "\r\n?", "\n")
+        columns.append(col)
+    return pa.RecordBatch.from_arrays(columns, schema=batch.schema)
+
+
+def iter_json_records(
+    path: str, limit: Optional[int] = None, columnar: bool = False
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Lazily parse a CSV with Arrow's C++ reader and yield
+    (row_count, comma-joined JSON objects) per record batch,
+    so a response can be streamed without holding every row in memory.
+    Every value is kept as a string, as csv.DictReader returned it.
+    With columnar=True each row is a JSON array in header order instead,
+    which drops the column names repeated in every object.
     """
-    import csv
-    rows = []
     if not os.path.exists(path):
-        return rows
+        return
+
+    header = read_csv_header(path)
+    if not header:
+        return
+
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=1 << 20),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in header},
+            strings_can_be_null=False,
+        ),
+    )
+
+    remaining = limit or None
+    for batch in reader:
+        if remaining is not None:
+            batch = batch.slice(0, remaining)
+            remaining -= batch.num_rows
+        batch = _universal_newlines(batch)
+        # A 1 MiB block can hold thousands of rows; encode it in zero-copy
+        # slices so only JSON_BATCH_ROWS dicts are alive at a time.
+        for start in range(0, batch.num_rows, JSON_BATCH_ROWS):
+            part = batch.slice(start, JSON_BATCH_ROWS)
+            if columnar:
+                rows = list(zip(*(col.to_pylist() for col in part.columns)))
+            else:
+                rows = part.to_pylist()
+            # One encoder call per slice; strip the list brackets
+            chunk = orjson.dumps(rows)
+            yield part.num_rows, chunk[1:-1]
+        if remaining == 0:
+            break
+
+
+def _json_cache_get(
+    key: Tuple[str, int, Optional[int], bool]
+) -> Optional[Tuple[int, bytes]]:
+    """Cached (count, rows) for key, marked as recently used, or None."""
+    with _JSON_CACHE_LOCK:
+        hit = _JSON_CACHE.get(key)
+        if hit is not None:
+            _JSON_CACHE.move_to_end(key)
+        return hit
+
+
+def cached_json_records(
+    path: str, mtime_ns: int, limit: Optional[int], columnar: bool = False
+) -> Tuple[int, bytes]:
+    """
+    (row count, comma-joined JSON rows) for a CSV, memoized per file
+    version: mtime_ns is part of the key, so a rewritten export is
+    parsed again while unchanged ones are served from memory.
+    The cache holds at most JSON_CACHE_MAX_BYTES of encoded rows.
+    """
+    global _JSON_CACHE_BYTES
+
+    key = (path, mtime_ns, limit, columnar)
+    hit = _json_cache_get(key)
+    if hit is not None:
+        return hit
+
+    count = 0
+    chunks = []
+    for rows, records in iter_json_records(path, limit, columnar):
+        chunks.append(records)
+        count += rows
+    result = (count, b",".join(chunks))
+
+    if len(result[1]) <= JSON_CACHE_MAX_BYTES:
+        with _JSON_CACHE_LOCK:
+            if key not in _JSON_CACHE:
+                _JSON_CACHE[key] = result
+                _JSON_CACHE_BYTES += len(result[1])
+            while _JSON_CACHE_BYTES > JSON_CACHE_MAX_BYTES:
+                _, (_, evicted) = _JSON_CACHE.popitem(last=False)
+                _JSON_CACHE_BYTES -= len(evicted)
+    return result
+
+
+@lru_cache(maxsize=64)
+def count_csv_rows(path: str, mtime_ns: int) -> int:
+    """
+    Number of records in a CSV without building any row objects.
+    A raw newline count would overcount the listing descriptions,
+    which carry embedded line breaks, so Arrow still tokenizes the
+    file but only materializes its first column.
+    """
+    header = read_csv_header(path)
+    if not header:
+        return 0
+
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=1 << 20),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=header[:1],
+            column_types={header[0]: pa.string()},
+        ),
+    )
+    return sum(batch.num_rows for batch in reader)
+
+
+def load_json_records(
+    path: str, mtime_ns: int, limit: Optional[int], columnar: bool = False
+) -> Tuple[int, bytes]:
+    """
+    cached_json_records() run on the I/O pool. Concurrent cache misses
+    for the same file version share a single parse instead of each
+    handler thread decoding the CSV on its own.
+    """
+    key = (path, mtime_ns, limit, columnar)
+    # Cache hits are answered on the handler thread, with no pool handoff
+    hit = _json_cache_get(key)
+    if hit is not None:
+        return hit
 
-    with open(path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for idx, row in enumerate(reader):
-            rows.append(row)
-            if limit and idx + 1 >= limit:
-                break
+    with _IO_LOCK:
+        future = _IO_PENDING.get(key)
+        if future is None:
+            future = _IO_POOL.submit(cached_json_records, *key)
+            _IO_PENDING[key] = future
+            future.add_done_callback(lambda done: _forget_pending(key, done))
+    return future.result()
 
-    return rows
+
+def _forget_pending(key: Tuple[str, int, Optional[int], bool], future: Future):
+    """Drop key's in-flight entry, unless a newer future has replaced it."""
+    with _IO_LOCK:
+        if _IO_PENDING.get(key) is future:
+            del _IO_PENDING[key]
 
 
 def find_latest_export(city: str, keyword: str):
@@ -106,14 +447,13 @@ def find_latest_export(city: str, keyword: str):
         analyzed_data
         log
     """
-    pattern = os.path.join(OUTPUT_DIR, f"{city}_*_{keyword}.csv")
-    files = glob.glob(pattern)
+    files = output_index().get((city, keyword))
 
     if not files:
         return None
 
-    files.sort(key=lambda f: os.path.getmtime(f), reverse=True)
-    return files[0]
+    _, path = max(files)
+    return path
 
 # -----------------------------------------------------------------------------
 # UI Pages
@@ -138,23 +478,247 @@ def maps_page():
 def api_tester_page():
     return render_template("api_tester.html")
 
+@app.after_request
+def add_output_version(resp: Response) -> Response:
+    """
+    Tag cheap polling endpoints with the output/ version so the dashboard
+    can skip /api/hotspots fetches while it has not changed.
+    """
+    if request.endpoint in OUTPUT_VERSION_ENDPOINTS:
+        resp.headers["X-Output-Version"] = str(output_version())
+    return resp
+
 # -----------------------------------------------------------------------------
 # API: Cities List
 # -----------------------------------------------------------------------------
 
 @app.route("/api/cities", methods=["GET"])
 def api_cities():
-    cities = [
-        {"code": cfg.code, "name": cfg.name}
-        for cfg in CITY_CONFIG.values()
-    ]
-    cities.sort(key=lambda x: x["name"])
-    return jsonify({"success": True, "cities": cities})
+    resp = Response(_CITIES_PAYLOAD, mimetype="application/json")
+    resp.set_etag(_CITIES_ETAG)
+    return conditional(resp)
 
 # -----------------------------------------------------------------------------
 # API: Run Analysis
 # -----------------------------------------------------------------------------
 
+def analyze_city(city: str, threshold: float, max_listings: Optional[int]) -> Dict:
+    summary = run_analysis(
+        city_code=city,
+        premium_threshold=threshold,
+        max_listings=max_listings,
+        verbose=False,
+    )
+
+    # Convert filesystem → URL
+    filename = os.path.basename(summary.get("map_path", ""))
+    summary["map_url"] = f"/maps/{filename}" if filename else None
+    return summary
+
+
+def _write_job_temp(data: bytes) -> str:
+    """
+    Write data to a uniquely named temp file in JOBS_DIR and return its
+    path, so concurrent writers never share a scratch file.
+    """
+    fd, tmp = tempfile.mkstemp(dir=JOBS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return tmp
+
+
+def write_job(job_id: str, state: Dict):
+    """
+    Atomically replace a job's state file. The writing process's pid is
+    recorded so a status poll can tell when that worker has gone away.
+    """
+    tmp = _write_job_temp(orjson.dumps(
+        {**state, "pid": os.getpid()}, option=orjson.OPT_SERIALIZE_NUMPY
+    ))
+    try:
+        os.replace(tmp, os.path.join(JOBS_DIR, f"{job_id}.json"))
+    except BaseException:
+        remove_file(tmp)
+        raise
+
+
+def read_job(job_id: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(JOBS_DIR, f"{job_id}.json"), "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def job_is_live(job_id: str, state: Optional[Dict]) -> bool:
+    """
+    True while a queued/running job's worker process still exists. Without
+    this, a job whose worker exited or was reloaded stays "running" forever.
+    """
+    if not state or state.get("status") not in ("queued", "running"):
+        return False
+    pid = state.get("pid")
+    if not isinstance(pid, int):
+        return False
+    if pid == os.getpid():
+        return job_id in _LIVE_JOBS
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+
+def _claim_path(code: str, threshold: float) -> str:
+    # Keyed like the output file prefix: city code and integer threshold
+    return os.path.join(JOBS_DIR, f"{code}_min{int(threshold)}.claim")
+
+
+def _drop_stale_claim(path: str, holder: str):
+    """
+    Remove a claim held by a dead job. Takeovers are serialized by a short
+    O_EXCL lock file, and the holder is re-read under it, so a fresh claim
+    that replaced the dead one in the meantime is never removed. A lock left
+    by a worker that died inside this window expires after a few seconds.
+    """
+    lock = f"{path}.lock"
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        try:
+            if time.time() - os.stat(lock).st_mtime > CLAIM_LOCK_TIMEOUT:
+                remove_file(lock)
+        except FileNotFoundError:
+            pass
+        time.sleep(0.01)  # another worker is taking over; the caller retries
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            current = f.read().strip()
+        if current == holder:
+            remove_file(path)
+    except FileNotFoundError:
+        pass
+    finally:
+        remove_file(lock)
+
+
+def claim_run(code: str, threshold: float, job_id: str) -> Optional[str]:
+    """
+    Reserve (city, threshold) for job_id so two runs never write the same
+    output files at once. Returns None once claimed, or the id of the live
+    job already holding it. A claim left behind by a dead job is taken over.
+    """
+    path = _claim_path(code, threshold)
+    # The id is written first and hard-linked into place, which fails if the
+    # claim exists; a claim file is therefore never seen without its holder.
+    tmp = _write_job_temp(job_id.encode())
+    # Registered before the link so our own threads never see the fresh
+    # claim as abandoned
+    _LIVE_JOBS.add(job_id)
+    claimed = False
+    try:
+        while True:
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        holder = f.read().strip()
+                except FileNotFoundError:
+                    continue  # released in between
+                if job_is_live(holder, read_job(holder)):
+                    return holder
+                _drop_stale_claim(path, holder)
+                continue
+
+            claimed = True
+            return None
+    finally:
+        remove_file(tmp)
+        if not claimed:
+            _LIVE_JOBS.discard(job_id)
+
+
+def release_run(code: str, threshold: float, job_id: str):
+    _LIVE_JOBS.discard(job_id)
+    path = _claim_path(code, threshold)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            holder = f.read().strip()
+    except FileNotFoundError:
+        return
+    if holder == job_id:
+        remove_file(path)
+
+
+def prune_jobs():
+    """
+    Delete job files not touched for JOB_RETENTION seconds, unless the job
+    is still running.
+    """
+    cutoff = time.time() - JOB_RETENTION
+    with os.scandir(JOBS_DIR) as entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue  # replaced or pruned by another worker mid-scan
+            job_id = entry.name.split(".", 1)[0]
+            if job_is_live(job_id, read_job(job_id)):
+                continue
+            remove_file(entry.path)
+
+
+def run_analyze_job(
+    job_id: str,
+    code: str,
+    city: str,
+    threshold: float,
+    max_listings: Optional[int],
+):
+    write_job(job_id, {"status": "running", "city": city})
+    finish_job(job_id, code, city, threshold, max_listings)
+
+
+def finish_job(
+    job_id: str,
+    code: str,
+    city: str,
+    threshold: float,
+    max_listings: Optional[int],
+) -> Dict:
+    """
+    Run a claimed analysis and record its outcome as finished or failed.
+    The final state is written before the claim is released, so a status
+    poll never sees a "running" job whose owner has let go of it.
+    Returns the final state.
+    """
+    try:
+        summary = analyze_city(city, threshold, max_listings)
+        state = {"status": "finished", "city": city, "summary": summary}
+    except Exception as ex:
+        state = {"status": "failed", "city": city, "error": str(ex)}
+    # Re-running a snapshot overwrites its exports in place, which leaves the
+    # directory mtime alone; rescan so this worker serves the new files now
+    _clear_output_index()
+    try:
+        write_job(job_id, state)
+    finally:
+        release_run(code, threshold, job_id)
+    return state
+
+
 @app.route("/api/analyze", methods=["POST"])
 def api_analyze():
     try:
@@ -164,25 +728,87 @@ def api_analyze():
         max_listings = p.get("max_listings")
 
         if not city:
-            return jsonify({"success": False, "error": "Missing city"}), 400
+            return json_response({"success": False, "error": "Missing city"}, 400)
 
         max_listings = int(max_listings) if max_listings else None
+        code = normalize_city_code(city)
+        is_async = bool(p.get("async"))
+
+        if is_async:
+            prune_jobs()
+
+        # One run per (city, threshold) at a time, sync or async. The state
+        # file goes first so other workers can check the claim holder.
+        job_id = uuid.uuid4().hex
+        job_path = os.path.join(JOBS_DIR, f"{job_id}.json")
+        write_job(job_id, {
+            "status": "queued" if is_async else "running",
+            "city": city,
+        })
+        holder = claim_run(code, threshold, job_id)
+        if holder is not None:
+            remove_file(job_path)
+            status_url = f"/api/analyze/status/{holder}"
+            # A repeated async request joins the job already in flight
+            if is_async:
+                return json_response({
+                    "success": True,
+                    "job_id": holder,
+                    "status_url": status_url,
+                }, 202)
+            return json_response({
+                "success": False,
+                "error": "An analysis for this city and threshold is already running",
+                "job_id": holder,
+                "status_url": status_url,
+            }, 409)
+
+        # {"async": true}: queue the run and return at once; poll the status URL
+        if is_async:
+            try:
+                ANALYZE_POOL.submit(
+                    run_analyze_job, job_id, code, city, threshold, max_listings
+                )
+            except BaseException:
+                # Never queued: free the pair rather than leave a job that
+                # looks live to every later request
+                release_run(code, threshold, job_id)
+                remove_file(job_path)
+                raise
+            return json_response({
+                "success": True,
+                "job_id": job_id,
+                "status_url": f"/api/analyze/status/{job_id}",
+            }, 202)
+
+        # Synchronous runs keep a job record too, so a 409 sent to another
+        # client while this one runs points at a status URL that resolves
+        state = finish_job(job_id, code, city, threshold, max_listings)
+        if state["status"] == "failed":
+            return json_response({"success": False, "error": state["error"]}, 500)
+        return json_response({"success": True, "summary": state["summary"]})
 
-        summary = run_analysis(
-            city_code=city,
-            premium_threshold=threshold,
-            max_listings=max_listings,
-            verbose=False,
-        )
+    except Exception as ex:
+        return json_response({"success": False, "error": str(ex)}, 500)
 
-        # Convert filesystem → URL
-        filename = os.path.basename(summary.get("map_path", ""))
-        summary["map_url"] = f"/maps/{filename}" if filename else None
 
-        return jsonify({"success": True, "summary": summary})
+@app.route("/api/analyze/status/<job_id>", methods=["GET"])
+def api_analyze_status(job_id):
+    state = read_job(job_id) if _JOB_ID_RE.fullmatch(job_id) else None
+    if state is None:
+        return json_response({"success": False, "error": "Unknown job"}, 404)
 
-    except Exception as ex:
-        return jsonify({"success": False, "error": str(ex)}), 500
+    # The worker that owned the job exited or was reloaded mid-run
+    if state["status"] in ("queued", "running") and not job_is_live(job_id, state):
+        state = {
+            "status": "failed",
+            "city": state.get("city"),
+            "error": "Analysis worker exited before the job finished",
+        }
+        write_job(job_id, state)
+
+    state.pop("pid", None)
+    return json_response({"success": True, "job_id": job_id, **state})
 
 # -----------------------------------------------------------------------------
 # API: Latest Analysis Metadata
@@ -192,14 +818,15 @@ def api_analyze():
 def api_last_run(city):
     latest = find_latest_run_for_city(city)
     if not latest:
-        return jsonify({"success": False, "error": "No runs found"}), 404
+        return json_response({"success": False, "error": "No runs found"}, 404)
 
-    return jsonify({
+    resp = json_response({
         "success": True,
         "city": latest["city"],
         "date": latest["date"],
         "threshold": latest["threshold"],
     })
+    return conditional(resp, os.stat(OUTPUT_DIR).st_mtime)
 
 # -----------------------------------------------------------------------------
 # API: Hotspot Data Explorer
@@ -212,41 +839,73 @@ def api_hotspots():
     key = request.args.get("key", "premium_clusters")
 
     if not city:
-        return jsonify({"success": False, "error": "Missing city"}), 400
-
-    patterns = {
-        "premium_clusters":      f"{city}_*_min{threshold}_premium_clusters.csv",
-        "luxury_clusters":       f"{city}_*_min{threshold}_luxury_clusters.csv",
-        "ultra_luxury_clusters": f"{city}_*_min{threshold}_ultra_luxury_clusters.csv",
-        "neighborhood_scores":   f"{city}_*_min{threshold}_neighborhood_scores.csv",
-        "raw_listings":          f"{city}_*_min{threshold}_analyzed_data.csv",
-        "log":                   f"{city}_*_min{threshold}_log.csv",
+        return json_response({"success": False, "error": "Missing city"}, 400)
+
+    keywords = {
+        "premium_clusters":      "premium_clusters",
+        "luxury_clusters":       "luxury_clusters",
+        "ultra_luxury_clusters": "ultra_luxury_clusters",
+        "neighborhood_scores":   "neighborhood_scores",
+        "raw_listings":          "analyzed_data",
+        "log":                   "log",
     }
 
-    if key not in patterns:
-        return jsonify({"success": False, "error": f"Invalid key '{key}'"}), 400
+    if key not in keywords:
+        return json_response(
+            {"success": False, "error": f"Invalid key '{key}'"}, 400
+        )
 
-    pattern = os.path.join(OUTPUT_DIR, patterns[key])
-    matches = glob.glob(pattern)
+    run_tag = f"_min{threshold}_"
+    matches = [
+        (mtime, path)
+        for mtime, path in output_index().get((city, keywords[key]), [])
+        if run_tag in os.path.basename(path)
+    ]
 
     if not matches:
-        return jsonify({"success": False, "error": "No CSV matches"}), 404
+        return json_response({"success": False, "error": "No CSV matches"}, 404)
 
-    matches.sort()
-    path = matches[-1]
+    # Latest by name (the snapshot date follows the city code)
+    path = max(p for _, p in matches)
 
     limit = 5000 if key == "raw_listings" else None
-    records = load_csv_records(path, limit)
-
-    return jsonify({
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    # Views that only show a total skip the JSON encoding entirely
+    if request.args.get("fields") == "count":
+        count = count_csv_rows(path, mtime_ns)
+        if limit is not None:
+            count = min(count, limit)
+        return json_response({
+            "success": True,
+            "city": city,
+            "threshold": float(threshold),
+            "key": key,
+            "count": count,
+        })
+
+    # ?format=columns sends {"columns": [...], "rows": [[...], ...]}
+    columnar = request.args.get("format") == "columns"
+    count, records = load_json_records(path, mtime_ns, limit, columnar)
+    head = orjson.dumps({
         "success": True,
         "city": city,
         "threshold": float(threshold),
         "key": key,
-        "count": len(records),
-        "data": records,
+        "count": count,
     })
 
+    # Splice the pre-encoded rows in rather than re-encoding them
+    if columnar:
+        columns = orjson.dumps(read_csv_header(path))
+        body = head[:-1] + b',"columns":' + columns + b',"rows":[' + records + b"]}"
+    else:
+        body = head[:-1] + b',"data":[' + records + b"]}"
+    resp = Response(body, mimetype="application/json")
+    resp.cache_control.public = True
+    resp.cache_control.max_age = API_CACHE_MAX_AGE
+    return resp
+
 # -----------------------------------------------------------------------------
 # API: Export Latest Files
 # -----------------------------------------------------------------------------
@@ -263,18 +922,23 @@ def api_export_latest(city, dtype):
     }
 
     if dtype not in mapping:
-        return jsonify({"error": f"Invalid export type '{dtype}'"}), 400
+        return json_response({"error": f"Invalid export type '{dtype}'"}, 400)
 
     keyword = mapping[dtype]
     path = find_latest_export(city, keyword)
 
     if not path:
-        return jsonify({"error": f"No export found for {city}/{dtype}"}), 404
+        return json_response({"error": f"No export found for {city}/{dtype}"}, 404)
 
+    # Conditional send: a repeat download with a matching ETag or
+    # If-Modified-Since gets 304 instead of the whole CSV again.
     return send_from_directory(
         OUTPUT_DIR,
         os.path.basename(path),
-        as_attachment=True
+        as_attachment=True,
+        conditional=True,
+        etag=True,
+        max_age=EXPORT_MAX_AGE,
     )
 
 # -----------------------------------------------------------------------------
@@ -283,17 +947,27 @@ def api_export_latest(city, dtype):
 
 @app.route("/api/maps/list", methods=["GET"])
 def api_maps_list():
-    result: Dict[str, list] = {}
+    global _MAPS_CACHE
+
+    # Maps only appear when an analysis finishes, which bumps the directory
+    # mtime; until then the previous scan is served as-is.
+    mtime_ns = os.stat(MAPS_DIR).st_mtime_ns
+    if mtime_ns != _MAPS_CACHE[0]:
+        # One sort of all names up front leaves every city bucket in order.
+        result: Dict[str, List[str]] = defaultdict(list)
 
-    for fn in os.listdir(MAPS_DIR):
-        if fn.endswith(".html"):
-            city = fn.split("_")[0]
-            result.setdefault(city, []).append(fn)
+        with os.scandir(MAPS_DIR) as entries:
+            names = sorted(e.name for e in entries if e.name.endswith(".html"))
+        for fn in names:
+            result[fn.split("_", 1)[0]].append(fn)
 
-    for c in result:
-        result[c].sort()
+        payload = orjson.dumps({"success": True, "maps": result})
+        _MAPS_CACHE = (mtime_ns, payload)
 
-    return jsonify({"success": True, "maps": result})
+    resp = Response(_MAPS_CACHE[1], mimetype="application/json")
+    resp.cache_control.public = True
+    resp.cache_control.max_age = API_CACHE_MAX_AGE
+    return conditional(resp, _MAPS_CACHE[0] / 1e9)
 
 # -----------------------------------------------------------------------------
 # Static Files
@@ -313,4 +987,5 @@ def static_files(path):
 # -----------------------------------------------------------------------------
 
 if __name__ == "__main__":
+    # Development server; production: gunicorn -c gunicorn.conf.py api_server:app
     app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,20 @@
+"""
+Gunicorn settings for serving the dashboard and API in production.
+
+    gunicorn -c gunicorn.conf.py api_server:app
+
+Several worker processes, each with a small thread pool, so one long CSV
+parse or analysis no longer stalls every other request the way the
+single-process development server does.
+"""
+
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = max(2, os.cpu_count() or 1)
+worker_class = "gthread"
+threads = 4
+
+# Import api_server (CITY_CONFIG, the pre-serialized cities payload) once in
+# the master and fork it into the workers.
+preload_app = True
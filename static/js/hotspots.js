@@ -78,8 +78,22 @@ document.addEventListener("DOMContentLoaded", () => {
   // ------------------------------------
   // Convert CSV -> table
   // ------------------------------------
+  // Split one CSV line, honouring "quoted, fields" and "" escapes
+  function splitCsvRow(line) {
+    const cells = [];
+    const re = /("(?:[^"]|"")*"|[^,]*)(,|$)/g;
+    let m;
+    while ((m = re.exec(line)) !== null) {
+      let cell = m[1];
+      if (cell.startsWith('"')) cell = cell.slice(1, -1).replace(/""/g, '"');
+      cells.push(cell);
+      if (m[2] === "") break;
+    }
+    return cells;
+  }
+
   function csvToTable(csv) {
-    const rows = csv.trim().split("\n").map((r) => r.split(","));
+    const rows = csv.trim().split("\n").map(splitCsvRow);
     if (!rows.length) return "<p>No data.</p>";
 
     let html = `<div class="table-wrapper"><table class="data-table">`;